@@ -12,13 +12,22 @@ Outputs: audit_report.json
 Exit code: 0 = PASS, 1 = CRITICAL failure (blocks CI commit)
 """
 
+import argparse
 import json
+import logging
 import os
 import sys
-import urllib.request
-import xml.etree.ElementTree as ET
 from datetime import datetime, timezone, timedelta
 
+import numpy as np
+
+from fpg_common import (
+    RATE_BOUNDS, REQUIRED_CURRENCIES, clear_ecb_cache, fetch_ecb_usd_rates,
+    setup_logging, utc_timestamp, write_json,
+)
+
+log = logging.getLogger("fpg.audit")
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 MARKET_DATA = os.path.join(SCRIPT_DIR, "market_data.json")
 AUDIT_REPORT = os.path.join(SCRIPT_DIR, "audit_report.json")
@@ -33,25 +42,11 @@ MAX_AGE_HOURS = 6
 WARN_DEVIATION_PCT = 3.0    # > 3% = WARNING
 CRITICAL_DEVIATION_PCT = 10.0  # > 10% = CRITICAL
 
-# Expected USD-based rate bounds (same as in scraper.py)
-RATE_BOUNDS = {
-    "EUR": (0.50, 1.50),   "GBP": (0.40, 1.30),   "JPY": (70, 250),
-    "CAD": (0.90, 2.00),   "AUD": (0.90, 2.20),    "CNY": (4.0, 10.0),
-    "CHF": (0.50, 1.50),   "HKD": (5.0, 10.0),     "SGD": (0.80, 2.00),
-    "SEK": (5.0, 16.0),    "KRW": (700, 2000),      "NOK": (5.0, 16.0),
-    "NZD": (0.90, 2.50),   "INR": (50, 130),        "MXN": (10, 30),
-    "TWD": (20, 45),       "ZAR": (10, 30),         "BRL": (3.0, 8.0),
-    "DKK": (4.0, 10.0),    "PLN": (2.5, 6.0),       "THB": (20, 50),
-    "IDR": (10000, 22000), "HUF": (200, 550),       "CZK": (15, 35),
-    "ILS": (2.5, 5.5),     "CLP": (500, 1400),      "PHP": (35, 75),
-    "AED": (3.0, 4.5),     "COP": (2500, 6000),     "SAR": (3.0, 4.5),
-    "MYR": (3.0, 7.0),     "RON": (3.0, 7.0),       "MAD": (7.0, 14.0),
-}
-
-# Major currencies that MUST be present
-REQUIRED_CURRENCIES = {"EUR", "GBP", "JPY", "CNY", "CHF", "CAD", "MAD"}
-
-ECB_DAILY_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+# Same bounds as parallel arrays (fixed code order) for the vectorized check
+_BOUND_CODES = tuple(RATE_BOUNDS)
+_CODE_IDX = {code: i for i, code in enumerate(_BOUND_CODES)}
+_LO = np.fromiter((lo for lo, _ in RATE_BOUNDS.values()), dtype=np.float64, count=len(RATE_BOUNDS))
+_HI = np.fromiter((hi for _, hi in RATE_BOUNDS.values()), dtype=np.float64, count=len(RATE_BOUNDS))
 
 
 # ── Helpers ──────────────────────────────────────────────────
@@ -64,58 +59,32 @@ def load_market_data() -> dict | None:
 
 
 def parse_last_update(date_str: str) -> datetime | None:
-    from datetime import datetime
-    for fmt in [
-        "%Y-%m-%dT%H:%M:%S.%f%z",
-        "%Y-%m-%dT%H:%M:%S.%f",
-        "%Y-%m-%dT%H:%M:%S%z",
-        "%Y-%m-%dT%H:%M:%S",
-    ]:
-        try:
-            return datetime.strptime(date_str, fmt)
-        except ValueError:
-            continue
-    # fallback: try fromisoformat
+    # scraper.py always writes fpg_common.utc_timestamp() (ISO-8601)
     try:
         return datetime.fromisoformat(date_str)
-    except Exception:
+    except ValueError:
         return None
 
 
 def fetch_ecb_rates() -> dict[str, float]:
     """Fetch ECB reference rates and convert to USD-based."""
     try:
-        req = urllib.request.Request(ECB_DAILY_URL,
-                                    headers={"User-Agent": "FPG-Audit/1.0"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            xml_data = resp.read()
-
-        root = ET.fromstring(xml_data)
-        ns = {"ecb": "http://www.ecb.int/vocabulary/2002-08-01/eurofxref"}
-
-        eur_rates = {"EUR": 1.0}
-        for cube in root.findall(".//ecb:Cube[@currency]", ns):
-            eur_rates[cube.attrib["currency"]] = float(cube.attrib["rate"])
-
-        eur_usd = eur_rates.get("USD", 0)
-        if eur_usd <= 0:
-            return {}
-
-        usd_rates = {"USD": 1.0}
-        for code, val in eur_rates.items():
-            if code != "USD":
-                usd_rates[code] = round(val / eur_usd, 6)
-        return usd_rates
+        return fetch_ecb_usd_rates()
     except Exception as e:
-        print(f"  ⚠  ECB fetch failed: {e}")
+        log.warning(f"  ⚠  ECB fetch failed: {e}")
         return {}
 
 
 # ── Audit Pipeline ───────────────────────────────────────────
 
-def run_audit() -> dict:
+def run_audit(fast_fail: bool = False) -> dict:
+    """
+    Runs every check against market_data.json. With fast_fail, the ECB
+    cross-check is skipped once a CRITICAL check has already failed —
+    the CI gate's verdict can no longer change.
+    """
     report = {
-        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "timestamp": utc_timestamp(),
         "status": "PASS",
         "checks": [],
         "summary": {},
@@ -180,29 +149,32 @@ def run_audit() -> dict:
         add_check("usd_base", "PASS")
 
     # ── 6. Required currencies
-    missing = REQUIRED_CURRENCIES - set(rates.keys())
+    missing = REQUIRED_CURRENCIES.difference(rates)
     if missing:
         add_check("required_currencies", "WARNING",
                    f"Missing: {', '.join(sorted(missing))}")
     else:
         add_check("required_currencies", "PASS")
 
-    # ── 7. Bounds check per currency
-    bounds_violations = []
-    for code, rate in rates.items():
-        if code == "USD":
-            continue
-        status_detail = {"rate": rate}
-        if code in RATE_BOUNDS:
-            lo, hi = RATE_BOUNDS[code]
-            if not (lo <= rate <= hi):
-                bounds_violations.append(code)
-                status_detail["bounds_status"] = "FAIL"
-                status_detail["bounds"] = [lo, hi]
-            else:
-                status_detail["bounds_status"] = "PASS"
-        else:
+    # ── 7. Bounds check per currency (two compares over the bounds arrays)
+    bounded = np.fromiter((rates.get(c, np.nan) for c in _BOUND_CODES),
+                          dtype=np.float64, count=len(_BOUND_CODES))
+    present = np.fromiter((c in rates for c in _BOUND_CODES), dtype=bool, count=len(_BOUND_CODES))
+    # Written as not-within so a NaN rate fails, like `not (lo <= rate <= hi)`
+    bad_mask = present & ~((bounded >= _LO) & (bounded <= _HI))
+    bounds_violations = [_BOUND_CODES[i] for i in np.flatnonzero(bad_mask)]
+
+    rate_codes = [code for code in rates if code != "USD"]
+    for code in rate_codes:
+        status_detail = {"rate": rates[code]}
+        i = _CODE_IDX.get(code)
+        if i is None:
             status_detail["bounds_status"] = "NO_BOUNDS"
+        elif bad_mask[i]:
+            status_detail["bounds_status"] = "FAIL"
+            status_detail["bounds"] = list(RATE_BOUNDS[code])
+        else:
+            status_detail["bounds_status"] = "PASS"
         report["details_per_currency"][code] = status_detail
 
     if bounds_violations:
@@ -211,26 +183,29 @@ def run_audit() -> dict:
     else:
         add_check("bounds_validation", "PASS")
 
-    # ── 8. ECB Cross-validation
-    ecb_rates = fetch_ecb_rates()
-    if not ecb_rates:
+    # ── 8. ECB Cross-validation (the only network call — skipped on fast-fail)
+    skip_ecb = fast_fail and critical
+    ecb_rates = {} if skip_ecb else fetch_ecb_rates()
+    if skip_ecb:
+        add_check("ecb_cross_check", "WARNING", "Skipped — already CRITICAL (--fast-fail)")
+    elif not ecb_rates:
         add_check("ecb_cross_check", "WARNING", "ECB data unavailable — skipped")
     else:
-        cross_errors = []
-        cross_warnings = []
-        for code, rate in rates.items():
-            if code == "USD":
-                continue
-            ecb_rate = ecb_rates.get(code)
-            if ecb_rate and ecb_rate > 0:
-                dev = abs(rate - ecb_rate) / ecb_rate * 100
-                entry = report["details_per_currency"].setdefault(code, {"rate": rate})
-                entry["ecb_rate"] = round(ecb_rate, 4)
-                entry["ecb_deviation_pct"] = round(dev, 2)
-                if dev > CRITICAL_DEVIATION_PCT:
-                    cross_errors.append(f"{code}({dev:.1f}%)")
-                elif dev > WARN_DEVIATION_PCT:
-                    cross_warnings.append(f"{code}({dev:.1f}%)")
+        rates_arr = np.array([rates[c] for c in rate_codes], dtype=np.float64)
+        ecb_arr = np.array([ecb_rates.get(c, np.nan) for c in rate_codes], dtype=np.float64)
+        has_ecb = ecb_arr > 0  # NaN (no ECB reference) compares False
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dev = np.abs(rates_arr - ecb_arr) / ecb_arr * 100
+        critical_mask = has_ecb & (dev > CRITICAL_DEVIATION_PCT)
+        warning_mask = has_ecb & ~critical_mask & (dev > WARN_DEVIATION_PCT)
+
+        for i in np.flatnonzero(has_ecb):
+            code = rate_codes[i]
+            entry = report["details_per_currency"].setdefault(code, {"rate": rates[code]})
+            entry["ecb_rate"] = round(float(ecb_arr[i]), 4)
+            entry["ecb_deviation_pct"] = round(float(dev[i]), 2)
+        cross_errors = [f"{rate_codes[i]}({dev[i]:.1f}%)" for i in np.flatnonzero(critical_mask)]
+        cross_warnings = [f"{rate_codes[i]}({dev[i]:.1f}%)" for i in np.flatnonzero(warning_mask)]
 
         if cross_errors:
             add_check("ecb_cross_check", "CRITICAL",
@@ -270,39 +245,56 @@ def run_audit() -> dict:
 
 # ── Main ─────────────────────────────────────────────────────
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Factory Pocket Pro exchange rate audit")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore cached ECB reference rates and refetch")
+    parser.add_argument("--fast-fail", action="store_true",
+                        help="skip the ECB cross-check once a CRITICAL check failed")
+    return parser.parse_args()
+
+
 def main():
-    print("🔍  Factory Pocket Pro — Exchange Rate Audit v1.0")
-    print(f"    {datetime.now(timezone.utc).isoformat()}\n")
+    args = parse_args()
+    setup_logging()
+    if args.no_cache:
+        clear_ecb_cache()
+
+    log.info("🔍  Factory Pocket Pro — Exchange Rate Audit v1.0")
+    log.info(f"    {utc_timestamp()}")
 
-    report = run_audit()
+    report = run_audit(fast_fail=args.fast_fail)
 
     # Save report
-    with open(AUDIT_REPORT, "w", encoding="utf-8") as f:
-        json.dump(report, f, indent=2, ensure_ascii=False)
-    print(f"\n📋  Audit report saved → {AUDIT_REPORT}")
+    write_json(AUDIT_REPORT, report)
 
-    # Print summary
+    # Summary is buffered and written in one go at the end
     s = report["summary"]
     status = report["status"]
     emoji = {"PASS": "✅", "WARNING": "⚠️", "CRITICAL": "❌"}.get(status, "❓")
-    print(f"\n{emoji}  AUDIT STATUS: {status}")
-    print(f"    Rates: {s['total_rates']}")
-    print(f"    Bounds violations: {s['bounds_violations']}")
-    print(f"    Warnings: {s['warnings']}")
+    lines = [
+        f"📋  Audit report saved → {AUDIT_REPORT}",
+        "",
+        f"{emoji}  AUDIT STATUS: {status}",
+        f"    Rates: {s['total_rates']}",
+        f"    Bounds violations: {s['bounds_violations']}",
+        f"    Warnings: {s['warnings']}",
+    ]
 
     for check in report["checks"]:
         icon = {"PASS": "✓", "WARNING": "⚠", "CRITICAL": "✗"}[check["status"]]
         line = f"    [{icon}] {check['check']}"
         if check.get("detail"):
             line += f" — {check['detail']}"
-        print(line)
+        lines.append(line)
 
+    lines.append("")
     if status == "CRITICAL":
-        print("\n❌  AUDIT FAILED — commit should be blocked.")
-        sys.exit(1)
+        lines.append("❌  AUDIT FAILED — commit should be blocked.")
     else:
-        print("\n✅  Audit passed.")
-        sys.exit(0)
+        lines.append("✅  Audit passed.")
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.exit(1 if status == "CRITICAL" else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,245 @@
+"""
+Factory Pocket Pro — Shared Backend Module
+
+Single home for everything scraper.py, audit_rates.py and
+test_currencies.py have in common:
+  1. Currency registries (EXCHANGER_PAIRS, RATE_BOUNDS, REQUIRED_CURRENCIES)
+  2. Timestamp, logging and JSON output helpers
+  3. ECB daily reference rates (fetch_ecb_usd_rates)
+
+ECB publishes once per business day, so the parsed USD-based rates are
+cached on disk (.ecb_cache.json) together with the `Last-Modified` header:
+  - cache younger than ECB_CACHE_TTL → served without any request
+  - older → conditional GET (If-Modified-Since); 304 reuses the cache
+Within one process the result is memoized, so repeated calls are free.
+"""
+
+import functools
+import io
+import json
+import logging
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+
+import urllib3
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback — same output, just slower
+    orjson = None
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# ── Currency Exchanger Registry ──────────────────────────────
+# Map of "Code" -> ("Ticker", InvertBool)
+# InvertBool: True if ticker is Code/USD (e.g. EURUSD=X), False if USD/Code
+EXCHANGER_PAIRS = {
+    "USD": ("USD", False), # Base
+    "EUR": ("EURUSD=X", True),
+    "GBP": ("GBPUSD=X", True),
+    "JPY": ("USDJPY=X", False),
+    "CAD": ("USDCAD=X", False),
+    "AUD": ("AUDUSD=X", True),
+    "CNY": ("USDCNY=X", False),
+    "CHF": ("USDCHF=X", False),
+    "HKD": ("USDHKD=X", False),
+    "SGD": ("USDSGD=X", False),
+    "SEK": ("USDSEK=X", False),
+    "KRW": ("USDKRW=X", False),
+    "NOK": ("USDNOK=X", False),
+    "NZD": ("NZDUSD=X", True),
+    "INR": ("USDINR=X", False),
+    "MXN": ("USDMXN=X", False),
+    "TWD": ("USDTWD=X", False),
+    "ZAR": ("USDZAR=X", False),
+    "BRL": ("USDBRL=X", False),
+    "DKK": ("USDDKK=X", False),
+    "PLN": ("USDPLN=X", False),
+    "THB": ("USDTHB=X", False),
+    "IDR": ("USDIDR=X", False),
+    "HUF": ("USDHUF=X", False),
+    "CZK": ("USDCZK=X", False),
+    "ILS": ("USDILS=X", False),
+    "CLP": ("USDCLP=X", False),
+    "PHP": ("USDPHP=X", False),
+    "AED": ("USDAED=X", False),
+    "COP": ("USDCOP=X", False),
+    "SAR": ("USDSAR=X", False),
+    "MYR": ("USDMYR=X", False),
+    "RON": ("USDRON=X", False),
+    "MAD": ("USDMAD=X", False),  # Morocco
+}
+
+# ── Sanity Bounds (1 USD = ? Currency) ───────────────────────
+# (min, max) — generous ranges to catch only truly aberrant values.
+# Updated Feb 2026. Ranges give ~±50% margin from recent norms.
+RATE_BOUNDS: dict[str, tuple[float, float]] = {
+    "EUR": (0.50, 1.50),
+    "GBP": (0.40, 1.30),
+    "JPY": (70,   250),
+    "CAD": (0.90, 2.00),
+    "AUD": (0.90, 2.20),
+    "CNY": (4.0,  10.0),
+    "CHF": (0.50, 1.50),
+    "HKD": (5.0,  10.0),
+    "SGD": (0.80, 2.00),
+    "SEK": (5.0,  16.0),
+    "KRW": (700,  2000),
+    "NOK": (5.0,  16.0),
+    "NZD": (0.90, 2.50),
+    "INR": (50,   130),
+    "MXN": (10,   30),
+    "TWD": (20,   45),
+    "ZAR": (10,   30),
+    "BRL": (3.0,  8.0),
+    "DKK": (4.0,  10.0),
+    "PLN": (2.5,  6.0),
+    "THB": (20,   50),
+    "IDR": (10000, 22000),
+    "HUF": (200,  550),
+    "CZK": (15,   35),
+    "ILS": (2.5,  5.5),
+    "CLP": (500,  1400),
+    "PHP": (35,   75),
+    "AED": (3.0,  4.5),
+    "COP": (2500, 6000),
+    "SAR": (3.0,  4.5),
+    "MYR": (3.0,  7.0),
+    "RON": (3.0,  7.0),
+    "MAD": (7.0,  14.0),
+}
+
+# Major currencies that MUST be present
+REQUIRED_CURRENCIES = frozenset({"EUR", "GBP", "JPY", "CNY", "CHF", "CAD", "MAD"})
+
+# ── ECB Reference ────────────────────────────────────────────
+ECB_CACHE_FILE = os.path.join(SCRIPT_DIR, ".ecb_cache.json")
+ECB_CACHE_TTL = 3600  # seconds
+
+ECB_DAILY_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
+ECB_CUBE_TAG = "{http://www.ecb.int/vocabulary/2002-08-01/eurofxref}Cube"
+USER_AGENT = "FPG/4.0"
+
+# Module-level pool: repeated fetches in one process reuse the TLS connection
+_SESSION = urllib3.PoolManager(num_pools=2, timeout=10, headers={"User-Agent": USER_AGENT})
+
+# ── Timestamps ───────────────────────────────────────────────
+# Every timestamp the backend writes (market_data.last_update,
+# audit_report.timestamp) is ISO-8601, UTC offset included, always with
+# microseconds — so readers can parse it with a bare fromisoformat().
+TIMESTAMP_TIMESPEC = "microseconds"
+
+
+def utc_timestamp() -> str:
+    """Current UTC time, e.g. 2026-02-15T09:03:26.374276+00:00."""
+    return datetime.now(timezone.utc).isoformat(timespec=TIMESTAMP_TIMESPEC)
+
+
+# ── Output ───────────────────────────────────────────────────
+
+def setup_logging(level: int = logging.INFO) -> logging.Logger:
+    """
+    Configures the shared "fpg" logger: one stdout handler, timestamped
+    lines. Module loggers ("fpg.scraper", …) propagate to it.
+    """
+    logger = logging.getLogger("fpg")
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(logging.Formatter("%(asctime)s  %(message)s", "%H:%M:%S"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+    return logger
+
+
+def write_json(path: str, obj):
+    """Writes `obj` as UTF-8, 2-space indented JSON (non-ASCII kept as-is)."""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(obj, f, indent=2, ensure_ascii=False)
+
+
+# ── ECB Reference Rates ──────────────────────────────────────
+
+def _load_ecb_cache() -> dict | None:
+    try:
+        with open(ECB_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_ecb_cache(last_modified: str | None, rates: dict[str, float]):
+    cache = {"fetched_at": time.time(), "last_modified": last_modified, "rates": rates}
+    try:
+        with open(ECB_CACHE_FILE, "w", encoding="utf-8") as f:
+            json.dump(cache, f)
+    except OSError:
+        pass  # cache is best-effort
+
+
+def parse_ecb_usd_rates(xml_data: bytes) -> dict[str, float]:
+    """
+    Parses the ECB daily XML (1 EUR = X Currency) and converts it to
+    USD-based rates (1 USD = X Currency). Returns {} if USD is missing.
+    """
+    # Stream the document instead of building the tree + XPath search
+    eur_rates: dict[str, float] = {"EUR": 1.0}
+    for _, elem in ET.iterparse(io.BytesIO(xml_data), events=("end",)):
+        if elem.tag == ECB_CUBE_TAG and "currency" in elem.attrib:
+            eur_rates[elem.attrib["currency"]] = float(elem.attrib["rate"])
+            elem.clear()
+
+    eur_usd = eur_rates.get("USD", 0)
+    if eur_usd <= 0:
+        return {}
+
+    # 1 USD = (eur_val / eur_usd) Currency — multiply by the reciprocal
+    inv = 1.0 / eur_usd
+    usd_rates: dict[str, float] = {"USD": 1.0}
+    usd_rates.update({code: round(val * inv, 6) for code, val in eur_rates.items() if code != "USD"})
+    return usd_rates
+
+
+@functools.lru_cache(maxsize=1)
+def fetch_ecb_usd_rates() -> dict[str, float]:
+    """
+    Latest ECB reference rates, USD-based (1 USD = X Currency).
+    Raises on network/parse failure — callers decide whether that blocks.
+    The returned dict is shared between callers: do not mutate it.
+    """
+    cache = _load_ecb_cache()
+    if cache and time.time() - cache.get("fetched_at", 0) < ECB_CACHE_TTL:
+        return cache["rates"]
+
+    headers = {"User-Agent": USER_AGENT}
+    if cache and cache.get("last_modified"):
+        headers["If-Modified-Since"] = cache["last_modified"]
+
+    resp = _SESSION.request("GET", ECB_DAILY_URL, headers=headers)
+    if resp.status == 304 and cache:
+        # Not modified — keep the cached rates, restart the TTL
+        _save_ecb_cache(cache.get("last_modified"), cache["rates"])
+        return cache["rates"]
+    if resp.status != 200:
+        raise urllib3.exceptions.HTTPError(f"ECB returned HTTP {resp.status}")
+
+    rates = parse_ecb_usd_rates(resp.data)
+    if rates:
+        _save_ecb_cache(resp.headers.get("Last-Modified"), rates)
+    return rates
+
+
+def clear_ecb_cache():
+    """Forces the next fetch_ecb_usd_rates() call to refetch from ECB."""
+    fetch_ecb_usd_rates.cache_clear()
+    try:
+        os.remove(ECB_CACHE_FILE)
+    except FileNotFoundError:
+        pass
@@ -14,13 +14,16 @@ v4.0 Changes:
 Designed for GitHub Actions cron (every 2h).
 """
 
+import argparse
+import asyncio
 import json
+import logging
 import os
+import random
 import sys
-import time
-import urllib.request
-import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from itertools import chain
 
 try:
     import yfinance as yf
@@ -28,6 +31,13 @@ except ImportError:
     print("❌  yfinance not installed — run:  pip install yfinance")
     sys.exit(1)
 
+from fpg_common import (
+    EXCHANGER_PAIRS, RATE_BOUNDS, clear_ecb_cache, fetch_ecb_usd_rates,
+    setup_logging, utc_timestamp, write_json,
+)
+
+log = logging.getLogger("fpg.scraper")
+
 # ── Ticker Registry ──────────────────────────────────────────
 # Ordered: international pairs first for currencies
 TICKERS = {
@@ -76,88 +86,12 @@ TICKERS = {
     },
 }
 
-# ── Currency Exchanger Registry ──────────────────────────────
-# Map of "Code" -> ("Ticker", InvertBool)
-# InvertBool: True if ticker is Code/USD (e.g. EURUSD=X), False if USD/Code
-EXCHANGER_PAIRS = {
-    "USD": ("USD", False), # Base
-    "EUR": ("EURUSD=X", True),
-    "GBP": ("GBPUSD=X", True),
-    "JPY": ("USDJPY=X", False),
-    "CAD": ("USDCAD=X", False),
-    "AUD": ("AUDUSD=X", True),
-    "CNY": ("USDCNY=X", False),
-    "CHF": ("USDCHF=X", False),
-    "HKD": ("USDHKD=X", False),
-    "SGD": ("USDSGD=X", False),
-    "SEK": ("USDSEK=X", False),
-    "KRW": ("USDKRW=X", False),
-    "NOK": ("USDNOK=X", False),
-    "NZD": ("NZDUSD=X", True),
-    "INR": ("USDINR=X", False),
-    "MXN": ("USDMXN=X", False),
-    "TWD": ("USDTWD=X", False),
-    "ZAR": ("USDZAR=X", False),
-    "BRL": ("USDBRL=X", False),
-    "DKK": ("USDDKK=X", False),
-    "PLN": ("USDPLN=X", False),
-    "THB": ("USDTHB=X", False),
-    "IDR": ("USDIDR=X", False),
-    "HUF": ("USDHUF=X", False),
-    "CZK": ("USDCZK=X", False),
-    "ILS": ("USDILS=X", False),
-    "CLP": ("USDCLP=X", False),
-    "PHP": ("USDPHP=X", False),
-    "AED": ("USDAED=X", False),
-    "COP": ("USDCOP=X", False),
-    "SAR": ("USDSAR=X", False),
-    "MYR": ("USDMYR=X", False),
-    "RON": ("USDRON=X", False),
-    "MAD": ("USDMAD=X", False),  # Morocco
-}
-
-# ── Sanity Bounds (1 USD = ? Currency) ───────────────────────
-# (min, max) — generous ranges to catch only truly aberrant values.
-# Updated Feb 2026. Ranges give ~±50% margin from recent norms.
-RATE_BOUNDS: dict[str, tuple[float, float]] = {
-    "EUR": (0.50, 1.50),
-    "GBP": (0.40, 1.30),
-    "JPY": (70,   250),
-    "CAD": (0.90, 2.00),
-    "AUD": (0.90, 2.20),
-    "CNY": (4.0,  10.0),
-    "CHF": (0.50, 1.50),
-    "HKD": (5.0,  10.0),
-    "SGD": (0.80, 2.00),
-    "SEK": (5.0,  16.0),
-    "KRW": (700,  2000),
-    "NOK": (5.0,  16.0),
-    "NZD": (0.90, 2.50),
-    "INR": (50,   130),
-    "MXN": (10,   30),
-    "TWD": (20,   45),
-    "ZAR": (10,   30),
-    "BRL": (3.0,  8.0),
-    "DKK": (4.0,  10.0),
-    "PLN": (2.5,  6.0),
-    "THB": (20,   50),
-    "IDR": (10000, 22000),
-    "HUF": (200,  550),
-    "CZK": (15,   35),
-    "ILS": (2.5,  5.5),
-    "CLP": (500,  1400),
-    "PHP": (35,   75),
-    "AED": (3.0,  4.5),
-    "COP": (2500, 6000),
-    "SAR": (3.0,  4.5),
-    "MYR": (3.0,  7.0),
-    "RON": (3.0,  7.0),
-    "MAD": (7.0,  14.0),
-}
-
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+MAX_WORKERS = 16  # fallback yfinance calls are network-bound — threads overlap the I/O
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 OUTPUT_FILE = "market_data.json"
+YF_CACHE_FILE = os.path.join(SCRIPT_DIR, ".yf_cache.json")
 
 # ── Per-ticker unit map ──────────────────────────────────────
 UNIT_MAP = {
@@ -190,41 +124,157 @@ CURRENCY_MAP = {
 
 # ── Helpers ──────────────────────────────────────────────────
 
-def fetch_with_retry(ticker: str, retries: int = MAX_RETRIES) -> dict | None:
+def download_close_frame(symbols: list[str]):
+    """
+    Close prices for `symbols` as one wide frame, one column per ticker.
+    group_by="ticker" always yields (ticker, field) columns, so the Close
+    level is taken once with xs() — no per-ticker column-shape probing.
+    Returns None when nothing came back.
+    """
+    data = yf.download(symbols, period="5d", interval="1d", group_by="ticker",
+                       threads=True, progress=False, timeout=15)
+    if data is None or data.empty:
+        return None
+    return data.sort_index(axis=1).xs("Close", level=1, axis=1)
+
+
+def ticker_closes(frame, symbol: str):
+    """Close series for `symbol`, without the NaN rows of other tickers."""
+    if frame is None or symbol not in frame.columns:
+        return None
+    series = frame[symbol].dropna()
+    return series if not series.empty else None
+
+
+def download_closes(symbols: list[str]) -> dict[str, list[float | None]]:
+    """
+    Downloads 5 days of daily bars for every symbol in a single yfinance
+    call and keeps the last two closes: {symbol: [latest, prev]}, prev is
+    None when only one bar came back. Symbols without data are left out
+    — callers then fall back to per-ticker fetches.
+    """
+    try:
+        frame = download_close_frame(symbols)
+    except Exception as exc:
+        log.warning(f"  ⚠  batch download failed: {exc}")
+        return {}
+
+    closes: dict[str, list[float | None]] = {}
+    for symbol in symbols:
+        # The batched index is the union of all tickers' trading days —
+        # ticker_closes drops the holes where this symbol did not trade.
+        series = ticker_closes(frame, symbol)
+        if series is None:
+            continue
+        prev = float(series.iloc[-2]) if len(series) > 1 else None
+        closes[symbol] = [float(series.iloc[-1]), prev]
+    return closes
+
+
+async def fetch_one(symbol: str, retries: int = MAX_RETRIES) -> list[float | None] | None:
+    """
+    [latest, prev] closes for one ticker, retried with jittered exponential
+    backoff. The blocking yfinance call runs in a worker thread and the
+    backoff is an asyncio sleep, so a failing ticker never holds up others.
+    """
     delay = RETRY_DELAY
     for attempt in range(1, retries + 1):
         try:
-            data = yf.download(ticker, period="5d", interval="1d",
-                               progress=False, timeout=15)
-            if data.empty or len(data) < 2:
-                print(f"  ⚠  {ticker}: not enough data (rows={len(data)})")
-                return None
+            frame = await asyncio.to_thread(download_close_frame, [symbol])
+            series = ticker_closes(frame, symbol)
+            if series is not None:
+                prev = float(series.iloc[-2]) if len(series) > 1 else None
+                return [float(series.iloc[-1]), prev]
+            log.warning(f"  ⚠  {symbol} attempt {attempt}/{retries}: no data",
+                        extra={"ticker": symbol})
+        except Exception as exc:
+            log.warning(f"  ⚠  {symbol} attempt {attempt}/{retries}: {exc}",
+                        extra={"ticker": symbol})
+        if attempt < retries:
+            await asyncio.sleep(delay + random.uniform(0, delay / 2))
+            delay *= 2
+    return None
 
-            if hasattr(data.columns, 'levels') and len(data.columns.levels) > 1:
-                data.columns = data.columns.droplevel(1)
 
-            latest = float(data["Close"].iloc[-1])
-            prev   = float(data["Close"].iloc[-2])
+async def _fetch_each(symbols: list[str]) -> dict[str, list[float | None] | None]:
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=MAX_WORKERS))
+    results = await asyncio.gather(*(fetch_one(symbol) for symbol in symbols))
+    return dict(zip(symbols, results))
 
-            if latest <= 0 or prev <= 0:
-                return None
 
-            trend = round(((latest - prev) / prev) * 100, 2)
-            return {"price": round(latest, 4), "trend": trend}
+def fetch_each(symbols: list[str]) -> dict[str, list[float | None] | None]:
+    """Per-ticker fallback: every symbol (and its retries) runs concurrently."""
+    return asyncio.run(_fetch_each(symbols))
 
-        except Exception as exc:
-            print(f"  ⚠  {ticker} attempt {attempt}/{retries}: {exc}")
-            if attempt < retries:
-                time.sleep(delay)
-                delay *= 2
-    return None
 
+def _cache_hour() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d-%H")
 
-def build_section(category: str, tickers: dict) -> list[dict]:
-    items = []
+
+def load_cached_closes() -> dict[str, list[float | None]]:
+    """Closes cached during the current UTC hour, else empty."""
+    try:
+        with open(YF_CACHE_FILE, "r", encoding="utf-8") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("closes", {}) if cache.get("hour") == _cache_hour() else {}
+
+
+def clear_cached_closes():
+    try:
+        os.remove(YF_CACHE_FILE)
+    except FileNotFoundError:
+        pass
+
+
+def fetch_closes(symbols: list[str]) -> dict[str, list[float | None]]:
+    """
+    Latest closes for `symbols`, served from the hourly on-disk cache when
+    possible; only uncached symbols go into the batched download, and
+    only what the batch missed is refetched per ticker.
+    """
+    closes = load_cached_closes()
+    missing = [symbol for symbol in symbols if symbol not in closes]
+    log.info(f"🌐  Batch download: {len(missing)} tickers "
+             f"({len(symbols) - len(missing)} cached this hour)…")
+    if missing:
+        closes.update(download_closes(missing))
+
+        # Fallback: refetch individually whatever the batch did not cover
+        leftover = [symbol for symbol in missing if symbol not in closes]
+        if leftover:
+            log.info(f"🔁  Refetching {len(leftover)} tickers individually…")
+            closes.update((symbol, pair) for symbol, pair in fetch_each(leftover).items()
+                          if pair is not None)
+        try:
+            write_json(YF_CACHE_FILE, {"hour": _cache_hour(), "closes": closes})
+        except OSError:
+            pass  # cache is best-effort
+    return closes
+
+
+def quote_from_closes(pair: list[float | None] | None) -> dict | None:
+    if pair is None or pair[1] is None:
+        return None
+
+    latest, prev = pair
+
+    if latest <= 0 or prev <= 0:
+        return None
+
+    trend = round(((latest - prev) / prev) * 100, 2)
+    return {"price": round(latest, 4), "trend": trend}
+
+
+def build_section(category: str, tickers: dict, closes: dict | None = None) -> list[dict]:
     currency = CURRENCY_MAP.get(category)
+    closes = closes or {}
+
+    items = []
     for symbol, label in tickers.items():
-        result = fetch_with_retry(symbol)
+        result = quote_from_closes(closes.get(symbol))
         if result is None:
             continue
         items.append({
@@ -240,60 +290,35 @@ def build_section(category: str, tickers: dict) -> list[dict]:
 
 # ── ECB Cross-Check ──────────────────────────────────────────
 
-ECB_DAILY_URL = "https://www.ecb.europa.eu/stats/eurofxref/eurofxref-daily.xml"
-
 def fetch_ecb_reference_rates() -> dict[str, float]:
     """
-    Fetches the latest ECB daily reference rates (EUR-based).
-    Converts them to USD-based (1 USD = X Currency).
-    Returns empty dict on failure (non-blocking).
+    Fetches the latest ECB daily reference rates, converted to USD-based
+    (1 USD = X Currency). Returns empty dict on failure (non-blocking).
     """
     try:
-        req = urllib.request.Request(ECB_DAILY_URL, headers={"User-Agent": "FPG-Scraper/4.0"})
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            xml_data = resp.read()
-        
-        root = ET.fromstring(xml_data)
-        ns = {"ecb": "http://www.ecb.int/vocabulary/2002-08-01/eurofxref"}
-        
-        # ECB gives EUR-based rates: 1 EUR = X Currency
-        eur_rates: dict[str, float] = {"EUR": 1.0}
-        for cube in root.findall(".//ecb:Cube[@currency]", ns):
-            code = cube.attrib["currency"]
-            rate = float(cube.attrib["rate"])
-            eur_rates[code] = rate
-        
-        # Convert to USD-based: 1 USD = X Currency
-        eur_usd = eur_rates.get("USD")
-        if not eur_usd or eur_usd <= 0:
-            return {}
-        
-        usd_rates: dict[str, float] = {"USD": 1.0}
-        for code, eur_val in eur_rates.items():
-            if code == "USD":
-                continue
-            # 1 USD = (eur_val / eur_usd) Currency
-            usd_rates[code] = round(eur_val / eur_usd, 6)
-        
-        print(f"    🏛  ECB reference: {len(usd_rates)} rates loaded")
+        usd_rates = fetch_ecb_usd_rates()
+        log.info(f"    🏛  ECB reference: {len(usd_rates)} rates loaded")
         return usd_rates
         
     except Exception as e:
-        print(f"    ⚠  ECB cross-check unavailable: {e}")
+        log.warning(f"    ⚠  ECB cross-check unavailable: {e}")
         return {}
 
 
 # ── Exchanger Rate Fetching (v4.0) ───────────────────────────
 
-def fetch_exchanger_rates() -> tuple[dict[str, float], dict]:
+def fetch_exchanger_rates(closes: dict | None = None,
+                          ecb_crosscheck: bool = True) -> tuple[dict[str, float], dict]:
     """
     Fetches rates for all currencies in EXCHANGER_PAIRS.
     Normalizes everything to: 1 USD = ? Currency
+    Prices are read from `closes` (see fetch_closes). With
+    ecb_crosscheck=False the ECB comparison is left to audit_rates.py.
     
     Returns:
         (rates_dict, audit_info_dict)
     """
-    print(f"💱  Fetching {len(EXCHANGER_PAIRS)} exchanger rates (v4.0)...")
+    log.info(f"💱  Fetching {len(EXCHANGER_PAIRS)} exchanger rates (v4.0)...")
     rates: dict[str, float] = {"USD": 1.0}
     
     audit = {
@@ -303,60 +328,31 @@ def fetch_exchanger_rates() -> tuple[dict[str, float], dict]:
         "bounds_rejected": [],
         "fetch_failed": [],
         "cross_check_deviations": {},
-        "cross_check_source": "ECB",
+        "cross_check_source": "ECB" if ecb_crosscheck else None,
     }
     
+    closes = closes or {}
     for code, (ticker, invert) in EXCHANGER_PAIRS.items():
         if code == "USD":
             continue
         
-        # ── Fetch with retry (period=5d for weekend resilience)
-        price = None
-        delay = RETRY_DELAY
-        for attempt in range(1, MAX_RETRIES + 1):
-            try:
-                data = yf.download(ticker, period="5d", interval="1d",
-                                   progress=False, timeout=15)
-                if data.empty:
-                    if attempt < MAX_RETRIES:
-                        time.sleep(delay)
-                        delay *= 2
-                        continue
-                    break
-                
-                # Handle multi-level columns
-                if hasattr(data.columns, 'levels') and len(data.columns.levels) > 1:
-                    data.columns = data.columns.droplevel(1)
-                
-                price = float(data["Close"].iloc[-1])
-                
-                if price <= 0:
-                    price = None
-                    continue
-                break  # success
-                
-            except Exception as e:
-                print(f"  ⚠  {code} ({ticker}) attempt {attempt}/{MAX_RETRIES}: {e}")
-                if attempt < MAX_RETRIES:
-                    time.sleep(delay)
-                    delay *= 2
-        
-        if price is None:
-            print(f"  ❌  {code}: all retries exhausted for {ticker}")
+        price = closes[ticker][0] if ticker in closes else None
+        if not price or price <= 0:
+            log.error(f"  ❌  {code}: all retries exhausted for {ticker}", extra={"ticker": ticker})
             audit["fetch_failed"].append(code)
             continue
         
         audit["fetched"] += 1
         
-        # ── Compute USD-based rate
-        final_rate = (1.0 / price) if invert else price
-        final_rate = round(final_rate, 6)
+        # ── Compute USD-based rate (rounded once, to the stored precision)
+        final_rate = round((1.0 / price) if invert else price, 4)
         
         # ── Bounds validation
-        if code in RATE_BOUNDS:
-            lo, hi = RATE_BOUNDS[code]
+        bounds = RATE_BOUNDS.get(code)
+        if bounds is not None:
+            lo, hi = bounds
             if not (lo <= final_rate <= hi):
-                print(f"  🚫  {code}: rate {final_rate} out of bounds [{lo}, {hi}]")
+                log.warning(f"  🚫  {code}: rate {final_rate} out of bounds [{lo}, {hi}]")
                 audit["bounds_rejected"].append({
                     "code": code, "rate": final_rate,
                     "bounds": [lo, hi],
@@ -364,10 +360,14 @@ def fetch_exchanger_rates() -> tuple[dict[str, float], dict]:
                 continue
         
         audit["validated"] += 1
-        rates[code] = round(final_rate, 4)
+        rates[code] = final_rate
     
     # ── ECB Cross-check
-    ecb_rates = fetch_ecb_reference_rates()
+    if ecb_crosscheck:
+        ecb_rates = fetch_ecb_reference_rates()
+    else:
+        log.info("    ⏭  ECB cross-check skipped (left to audit)")
+        ecb_rates = {}
     if ecb_rates:
         for code, scraped_rate in rates.items():
             if code == "USD":
@@ -382,12 +382,12 @@ def fetch_exchanger_rates() -> tuple[dict[str, float], dict]:
                         "deviation_pct": round(deviation_pct, 2),
                     }
                     if deviation_pct > 15:
-                        print(f"  🚨  {code}: CRITICAL deviation {deviation_pct:.1f}% "
-                              f"(scraped={scraped_rate}, ECB={ecb_rate:.4f})")
+                        log.error(f"  🚨  {code}: CRITICAL deviation {deviation_pct:.1f}% "
+                                  f"(scraped={scraped_rate}, ECB={ecb_rate:.4f})")
     
     audit["final_count"] = len(rates)
-    print(f"    ✅ {audit['validated']}/{audit['total_requested']} rates validated, "
-          f"{len(audit['cross_check_deviations'])} cross-check warnings")
+    log.info(f"    ✅ {audit['validated']}/{audit['total_requested']} rates validated, "
+             f"{len(audit['cross_check_deviations'])} cross-check warnings")
     
     return rates, audit
 
@@ -395,24 +395,52 @@ def fetch_exchanger_rates() -> tuple[dict[str, float], dict]:
 
 # ── Main ─────────────────────────────────────────────────────
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Factory Pocket Pro market scraper")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="ignore cached ECB reference rates and refetch")
+    parser.add_argument("--force-refresh", action="store_true",
+                        help="ignore yfinance closes cached this hour and refetch")
+    parser.add_argument("--skip-ecb-crosscheck", action="store_true",
+                        default=bool(os.environ.get("SKIP_ECB_CROSSCHECK")),
+                        help="leave ECB cross-validation to audit_rates.py "
+                             "(env: SKIP_ECB_CROSSCHECK)")
+    return parser.parse_args()
+
+
 def main():
-    print("🏭  Factory Pocket Pro — Market Scraper v4.0")
-    print(f"    {datetime.now(timezone.utc).isoformat()}\n")
+    args = parse_args()
+    setup_logging()
+    if args.no_cache:
+        clear_ecb_cache()
+    if args.force_refresh:
+        clear_cached_closes()
+
+    log.info("🏭  Factory Pocket Pro — Market Scraper v4.0")
+    log.info(f"    {utc_timestamp()}")
 
     results: dict[str, list] = {}
     total = 0
 
+    # One batched request for every ticker; per-ticker fetches are fallback only
+    all_symbols = list(dict.fromkeys(chain(
+        chain.from_iterable(TICKERS.values()),
+        (ticker for ticker, _ in EXCHANGER_PAIRS.values() if ticker != "USD"),
+    )))
+    closes = fetch_closes(all_symbols)
+
     for category, tickers in TICKERS.items():
-        print(f"📦  Fetching {category} ({len(tickers)} tickers)…")
-        section = build_section(category, tickers)
+        log.info(f"📦  Fetching {category} ({len(tickers)} tickers)…")
+        section = build_section(category, tickers, closes)
         results[category] = section
         total += len(section)
-        print(f"    ✅ {len(section)}/{len(tickers)} OK\n")
+        log.info(f"    ✅ {len(section)}/{len(tickers)} OK")
 
-    exchanger_rates, exchanger_audit = fetch_exchanger_rates()
+    exchanger_rates, exchanger_audit = fetch_exchanger_rates(
+        closes, ecb_crosscheck=not args.skip_ecb_crosscheck)
 
     output = {
-        "last_update": datetime.now(timezone.utc).isoformat(),
+        "last_update": utc_timestamp(),
         "totalItems":  total,
         "indices":     results.get("indices", []),
         "currencies":  results.get("currencies", []),
@@ -423,20 +451,19 @@ def main():
         "exchanger_audit": exchanger_audit,
     }
 
-    out_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), OUTPUT_FILE)
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(output, f, indent=2, ensure_ascii=False)
+    out_path = os.path.join(SCRIPT_DIR, OUTPUT_FILE)
+    write_json(out_path, output)
 
-    print(f"\n📄  Saved {total} items + {len(exchanger_rates)} rates → {out_path}")
+    log.info(f"📄  Saved {total} items + {len(exchanger_rates)} rates → {out_path}")
 
     if total == 0:
-        print("❌  No data fetched — exiting with error code.")
+        log.error("❌  No data fetched — exiting with error code.")
         sys.exit(1)
 
     # Fail if too many exchanger rates failed
     if exchanger_audit["validated"] < 10:
-        print(f"❌  Only {exchanger_audit['validated']} rates validated — "
-              f"minimum 10 required. Exiting with error.")
+        log.error(f"❌  Only {exchanger_audit['validated']} rates validated — "
+                  f"minimum 10 required. Exiting with error.")
         sys.exit(1)
 
 